@@ -3,15 +3,19 @@ import os
 import subprocess
 import tkinter
 import turtle
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import ExitStack
+from functools import lru_cache, partial
+from itertools import islice
 from pathlib import Path
-from shutil import copyfile
-from string import digits
+from shutil import copyfile, which
+from string import ascii_letters, ascii_lowercase, ascii_uppercase, digits
 from tempfile import TemporaryDirectory
-from typing import Any, Callable, cast, Collection, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from typing import (Any, Callable, cast, Collection, Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence,
+                    Tuple, Union)
 
 from packaging import version
-from PIL import Image
+from PIL import Image, ImageChops
 
 # Types:
 Color = Tuple[int, int, int]
@@ -33,11 +37,16 @@ DEFAULT_COLORS = (
 PNG_EXT, GIF_EXT, EPS_EXT = '.png', '.gif', '.eps'
 FINAL_NAME, FRAME_NAME, LEVEL_NAME, DRAW_DIR_NAME = 'final', 'frame', 'level', 'draw'
 DPI = 96
+SWAPPED_CASES = {letter: letter.swapcase() for letter in ascii_letters}
+MAX_CACHED_CHARS = 2**24
+MAX_EPS_PER_GHOSTSCRIPT = 100  # Keeps ghostscript command lines far below Windows' 32767 character limit.
 
 # Mutating globals:
 _DRAW_NUMBER = 0
 _INITIALIZED = _WAITED = _SILENT = False
 _GHOSTSCRIPT = ''
+_SPARE_TURTLE: Optional[turtle.Turtle] = None
+_EXPANSIONS: Dict[Tuple[str, FrozenSet[Tuple[str, str]]], Dict[int, str]] = {}
 
 # Exit exception:
 Exit = turtle.Terminator, tkinter.TclError
@@ -47,6 +56,8 @@ Exit = turtle.Terminator, tkinter.TclError
 
 class State:  # pylint: disable=too-many-instance-attributes,too-few-public-methods
     """L-system state."""
+    __slots__ = ('position', 'heading', 'angle', 'length', 'thickness', 'pen_color', 'fill_color', 'turn_sign',
+                 'swap_cases', 'modify_fill')  # One is pushed per [ so they're kept small.
 
     def __init__(
         self,
@@ -56,7 +67,7 @@ class State:  # pylint: disable=too-many-instance-attributes,too-few-public-meth
         thickness: float,
         pen_color: Optional[Tuple[float, float, float]],
         fill_color: Optional[Tuple[float, float, float]],
-        swap_signs: bool,
+        turn_sign: float,
         swap_cases: bool,
         modify_fill: bool
     ) -> None:
@@ -67,7 +78,7 @@ class State:  # pylint: disable=too-many-instance-attributes,too-few-public-meth
         self.thickness = thickness
         self.pen_color = pen_color
         self.fill_color = fill_color
-        self.swap_signs = swap_signs
+        self.turn_sign = turn_sign
         self.swap_cases = swap_cases
         self.modify_fill = modify_fill
 
@@ -403,7 +414,7 @@ def draw(
     Documentation available on a single page at https://github.com/discretegames/TurtLSystems#draw
     """
     start = fix_ellipsis(start, 'F+G+G')
-    global _DRAW_NUMBER, _GHOSTSCRIPT
+    global _DRAW_NUMBER, _GHOSTSCRIPT, _SPARE_TURTLE
     _DRAW_NUMBER += 1
     if _WAITED:
         message('Did not draw() because wait() was already called.')
@@ -443,8 +454,7 @@ def draw(
                     font_style=font_style, text_align=text_align, transparent=transparent, antialiasing=antialiasing
                 )
                 if lvl != level:
-                    lvl_t.clear()
-                    lvl_t.hideturtle()
+                    _SPARE_TURTLE = lvl_t  # Cleared and reused by the next level rather than left on the screen.
 
             rect_for_all = None
             for i, lvl_png in enumerate(reversed(pngs)):
@@ -480,7 +490,11 @@ def draw(
         saved_tracer, saved_delay = turtle.tracer(), turtle.delay()
         turtle.tracer(0, 0)
 
-    t = turtle.Turtle()
+    if _SPARE_TURTLE is not None:
+        t, _SPARE_TURTLE = _SPARE_TURTLE, None
+        t.reset()
+    else:
+        t = turtle.Turtle()
     if text and text_color:
         orient(t, text_position)
         t.pencolor(text_color)
@@ -627,11 +641,7 @@ def lsystem(start: str, rules: Union[Dict[str, str], str], level: int) -> str:
     ---
     Documentation available on a single page at https://github.com/discretegames/TurtLSystems#lsystem
     """
-    if isinstance(rules, str):
-        rules = make_rules(rules)
-    for _ in range(level):
-        start = ''.join(rules.get(c, c) for c in start)
-    return start
+    return expand(start, frozenset(make_rules(rules).items()), level)
 
 
 ####################
@@ -645,15 +655,11 @@ def message(*args: Any, **kwargs: Any) -> None:
         print(*args, **kwargs)
 
 
-def clamp(value: float, minimum: int = 0, maximum: int = 255) -> float:
-    """Clamps `value` between `minimum` and `maximum`."""
-    return max(minimum, min(value, maximum))
-
-
 def conform_color(color: Optional[Sequence[float]]) -> OpColor:
     """Ensures `color` is a tuple with 0-255 clamped rgb."""
-    if color:
-        return round(clamp(color[0])), round(clamp(color[1])), round(clamp(color[2]))
+    if color:  # Clamping is inlined since this runs on every color change of a draw.
+        r, g, b = color[0], color[1], color[2]
+        return round(max(0, min(r, 255))), round(max(0, min(g, 255))), round(max(0, min(b, 255)))
     return None
 
 
@@ -665,11 +671,50 @@ def make_rules(rules: Union[Dict[str, str], str]) -> Dict[str, str]:
     return rules
 
 
+def expand(start: str, rules: FrozenSet[Tuple[str, str]], level: int) -> str:
+    """Memoized L-system expansion. Every level is cached so repeated draws of the same pattern, or draws of deeper
+    levels of it (e.g. growth gifs), continue from the deepest expansion already computed."""
+    if level <= 0:
+        return start
+    levels = _EXPANSIONS.pop((start, rules), {0: start})
+    _EXPANSIONS[start, rules] = levels  # Reinserted so the cache stays ordered from least to most recently used.
+    if level in levels:
+        return levels[level]
+    lookup = {key: value for key, value in rules if len(key) == 1}  # Longer keys can never match a character.
+    table = str.maketrans(lookup) if all(len(value) == 1 for value in lookup.values()) else None
+    get = lookup.get
+    deepest = max(lvl for lvl in levels if lvl < level)
+    string = levels[deepest]
+    for lvl in range(deepest + 1, level + 1):
+        if table is not None:  # One-to-one replacements let str.translate do the whole pass in C.
+            string = string.translate(table)
+        else:  # Passing the string twice makes each character its own default, i.e. get(c, c), with no Python loop.
+            string = ''.join(map(get, string, string))
+        if _EXPANSIONS.get((start, rules)) is levels:  # Once even the start doesn't fit nothing more is cached.
+            levels[lvl] = string
+            trim_expansions()  # Trimmed per level so the intermediate levels never pile up past the limit.
+    return string
+
+
+def trim_expansions() -> None:
+    """Evicts least recently used cached expansions until they fit in `MAX_CACHED_CHARS`.
+    The most recent pattern loses its deepest levels first and is only evicted once its start alone doesn't fit."""
+    total = sum(len(string) for levels in _EXPANSIONS.values() for string in levels.values())
+    while total > MAX_CACHED_CHARS:
+        key = next(iter(_EXPANSIONS))
+        levels = _EXPANSIONS[key]
+        if len(_EXPANSIONS) > 1 or len(levels) == 1:
+            total -= sum(len(string) for string in levels.values())
+            del _EXPANSIONS[key]
+        else:
+            total -= len(levels.pop(max(levels)))
+
+
 def make_colors(color: OpColor, fill_color: OpColor, colors: Optional[Iterable[OpColor]]) -> Tuple[OpColor, ...]:
     """Creates final colors tuple."""
     if colors is None:
         return conform_color(color), conform_color(fill_color), *DEFAULT_COLORS[2:]
-    colors = [conform_color(c) for c, _ in zip(colors, range(len(DEFAULT_COLORS)))]
+    colors = [conform_color(c) for c in islice(colors, len(DEFAULT_COLORS))]
     colors.extend(DEFAULT_COLORS[len(colors):])
     return tuple(colors)
 
@@ -690,20 +735,26 @@ def orient(t: turtle.Turtle, position: Optional[Tuple[float, float]], heading: O
     """Silently orients turtle `t` to given `position` and `heading`."""
     speed = t.speed()
     down, visible = t.isdown(), t.isvisible()
-    t.penup()
-    t.hideturtle()
-    t.speed(0)
+    # Each turtle setter is a full pen update, so ones that wouldn't change anything are skipped.
+    if down:
+        t.penup()
+    if visible:
+        t.hideturtle()
+    if speed:
+        t.speed(0)
     if position:
         t.setposition(position)
     if heading is not None:
         t.setheading(heading)
-    t.speed(speed)
+    if speed:
+        t.speed(speed)
     if down:
         t.pendown()
     if visible:
         t.showturtle()
 
 
+@lru_cache(maxsize=None)
 def guess_ghostscript() -> str:
     """Guess the path to ghostscript. Only guesses well on Windows.
     Should prevent people from needing to add ghostscript to PATH.
@@ -715,6 +766,10 @@ def guess_ghostscript() -> str:
         return version.parse(v.name[2:])  # When this is an inline lambda mypy and pylint fuss.
     locations = 'C:\\Program Files\\gs', 'C:\\Program Files (x86)\\gs'
     files = 'gswin64c.exe', 'gswin32c.exe', 'gs.exe'
+    for file in files:  # One PATH lookup is cheaper than walking the install folders, and respects the user's PATH.
+        found = which(file)
+        if found:
+            return found
     for location in locations:
         path = Path(location)
         if path.exists():
@@ -728,8 +783,13 @@ def guess_ghostscript() -> str:
     return 'gswin64c'  # Last ditch guess.
 
 
-def eps_to_png(eps: str, png: str, size: Tuple[int, int], output_scale: float, antialiasing: int) -> None:
-    """Uses ghostscript to convert eps file to png with transparent background."""
+def eps_to_png(eps: Union[str, List[str]], png: str, size: Tuple[int, int], output_scale: float,
+               antialiasing: int) -> None:
+    """Uses ghostscript to convert eps file(s) to png with transparent background.
+    When given multiple eps files they are all converted by one ghostscript process, sparing the startup cost of each,
+    and `png` should contain `%d` which ghostscript replaces with the 1-based page number.
+    A single eps file is given a rendering thread per cpu, used when ghostscript renders a large page in bands.
+    """
     result = subprocess.run([_GHOSTSCRIPT,
                              '-q',
                             '-dSAFER',
@@ -741,8 +801,9 @@ def eps_to_png(eps: str, png: str, size: Tuple[int, int], output_scale: float, a
                              f'-g{round(output_scale * size[0])}x{round(output_scale * size[1])}',
                              f'-dGraphicsAlphaBits={antialiasing}',
                              f'-dTextAlphaBits={antialiasing}',
+                             *([f'-dNumRenderingThreads={os.cpu_count() or 1}'] if isinstance(eps, str) else []),
                              f'-sOutputFile={png}',
-                             eps],
+                             *([eps] if isinstance(eps, str) else eps)],
                             check=False, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, encoding='utf-8')
     if result.returncode:
         message(f'Ghostscript ({_GHOSTSCRIPT}) exit code {result.returncode}:')
@@ -753,19 +814,22 @@ def get_padding_rect(
         image: Image.Image, padding: int, background_color: Color) -> Tuple[int, int, int, int]:
     """Returns rectangle around content pixels in `image` padded by `padding` on all sides."""
     message(f'Calculating padding for {image.width}x{image.height} pixel image...')
-    x_min, y_min, x_max, y_max = image.width - 1, image.height - 1, 0, 0
-    data = image.load()
-    empty = True
-    for y in range(image.height):
-        for x in range(image.width):
-            if data[x, y][3] == 0 or background_color == data[x, y][:3]:
-                continue
-            empty = False
-            x_min = min(x_min, x)
-            y_min = min(y_min, y)
-            x_max = max(x_max, x)
-            y_max = max(y_max, y)
-    if empty:
+    # Content pixels are those that aren't transparent and aren't the background color. Found with whole-image
+    # Pillow operations rather than a per-pixel Python loop. The non-transparent bounds come straight from the alpha
+    # channel, then only that region is checked for background colored pixels.
+    try:
+        bbox = image.getbbox(alpha_only=True)  # Pillow 10.1+ scans the alpha band in place rather than copying it out.
+    except TypeError:
+        bbox = image.getchannel('A').getbbox()
+    if bbox:
+        region = image.crop(bbox)
+        difference = ImageChops.difference(region.convert('RGB'), Image.new('RGB', region.size, background_color))
+        opaque = region.getchannel('A').point(lambda alpha: 255 if alpha else 0)
+        content = Image.composite(difference, Image.new('RGB', region.size), opaque).getbbox()
+        bbox = content and (bbox[0] + content[0], bbox[1] + content[1], bbox[0] + content[2], bbox[1] + content[3])
+    if bbox:
+        x_min, y_min, x_max, y_max = bbox[0], bbox[1], bbox[2] - 1, bbox[3] - 1
+    else:
         x_min = x_max = image.width//2
         y_min = y_max = image.height//2
     x_min -= padding
@@ -818,29 +882,56 @@ def save_png(
     if not png:
         png = eps
     png = str(Path(png).with_suffix(PNG_EXT).resolve())
-    eps_to_png(eps, png, size, output_scale, antialiasing)
+    eps_to_png(eps, png.replace('%', '%%'), size, output_scale, antialiasing)
+    return png, finish_png(png, output_scale, background_color, transparent, padding, rect)
+
+
+def finish_png(
+    png: str,
+    output_scale: float,
+    background_color: Color,
+    transparent: bool,
+    padding: Optional[int],
+    rect: Optional[Tuple[int, int, int, int]] = None,
+) -> Optional[Tuple[int, int, int, int]]:
+    """Gives png file produced by ghostscript its background and padding. Returns padding rectangle used."""
     image = Image.open(png).convert('RGBA')
     image, rect = pad_image(image, padding, rect, output_scale, background_color, transparent)
     image.save(png)
-    return png, rect
+    return rect
 
 
 def prep_gif(eps_paths: List[str], size: Tuple[int, int], background_color: Color, output_scale: float,
              antialiasing: int, padding: Optional[int], transparent: bool) -> List[str]:
     """Converts eps files into pngs in preperation for gif. Returns list of png paths."""
-    pngs, rect_for_all = [], None
-    for i, eps in enumerate(reversed(eps_paths)):  # Reverse so rect_for_all corresponds to last frame.
-        png, rect = save_png(None, eps, size, output_scale, antialiasing,
-                             background_color, transparent, padding, rect_for_all)
-        pngs.append(png)
+    message(f'Making {len(eps_paths)} gif frames..', end='', flush=True)
+    unique = list(dict.fromkeys(eps_paths))  # Frames where the canvas didn't change repeat an earlier eps file.
+    folder = Path(unique[0]).parent  # Frames all live in the drawdir, which make_drawdir already resolved.
+    pngs = [str(folder / f'{Path(eps).stem}{PNG_EXT}') for eps in unique]
+    # Frames are split into batches of consecutive frames, each converted by its own ghostscript process, with one
+    # process per cpu at a time. Batches are spread evenly over the cpus but never exceed MAX_EPS_PER_GHOSTSCRIPT files
+    # so the command line length doesn't depend on the number of cpus.
+    workers = min(len(unique), os.cpu_count() or 1)
+    per_batch = min(-(-len(unique) // workers), MAX_EPS_PER_GHOSTSCRIPT)
+
+    def convert(first: int) -> None:
+        numbered = str(folder).replace('%', '%%') + os.sep + f'{FRAME_NAME}{first}-%d{PNG_EXT}'
+        eps_to_png(unique[first:first + per_batch], numbered, size, output_scale, antialiasing)
+        for page, png in enumerate(pngs[first:first + per_batch], 1):  # Ghostscript numbers pages from 1.
+            os.replace(folder / f'{FRAME_NAME}{first}-{page}{PNG_EXT}', png)
+
+    with ThreadPoolExecutor(workers) as executor:  # Threads suffice since the work happens in the subprocesses.
+        list(executor.map(convert, range(0, len(unique), per_batch)))
+    rect_for_all = None
+    for i, png in enumerate(reversed(pngs)):  # Reverse so rect_for_all corresponds to last frame.
+        rect = finish_png(png, output_scale, background_color, transparent, padding, rect_for_all)
         if not i:
             rect_for_all = rect
-            message(f'Making {len(eps_paths)} gif frames..', end='', flush=True)
-        elif (len(eps_paths) - i) % 10 == 0:
-            message(f'{len(eps_paths) - i}..', end='', flush=True)
-    pngs.reverse()
+        elif (len(pngs) - i) % 10 == 0:
+            message(f'{len(pngs) - i}..', end='', flush=True)
     message('.')
-    return pngs
+    png_of = dict(zip(unique, pngs))
+    return [png_of[eps] for eps in eps_paths]
 
 
 def save_gif(
@@ -855,15 +946,25 @@ def save_gif(
     alternate: bool,
 ) -> str:
     """Saves gif from pre-generated png files. Returns path to gif."""
-    images = [Image.open(png).convert('RGBA') for png in pngs]
+    order = list(range(len(pngs)))
     if reverse:
-        images.reverse()
+        order.reverse()
     if alternate:
-        images.extend(images[-2:0:-1])
+        order.extend(order[-2:0:-1])
+    order = [order[0]] * (defer // duration) + order + [order[-1]] * (pause // duration)
+
+    def load_frames() -> Iterator[Image.Image]:
+        # Frames are opened as Pillow asks for them so they aren't all held in memory at once as RGBA images.
+        last, image = '', None
+        for i in order:
+            if pngs[i] != last:  # Repeated frames, like the pause at the end, are only opened once.
+                last, image = pngs[i], Image.open(pngs[i]).convert('RGBA')
+            yield cast(Image.Image, image)
+
     gif = str(Path(gif).with_suffix(GIF_EXT).resolve())
-    frames = [images[0]] * (defer // duration) + images + [images[-1]] * (pause // duration)
-    frames[0].save(gif, save_all=True, append_images=frames[1:], loop=loops or 0, duration=duration,
-                   optimize=True, transparency=0 if transparent else 255)
+    frames = load_frames()
+    next(frames).save(gif, save_all=True, append_images=frames, loop=loops or 0, duration=duration,
+                      optimize=True, transparency=0 if transparent else 255)
     # PIL seems to treat blank animated gifs like static gifs, so their timing is wrong. But nbd since they're blank.
     return gif
 
@@ -894,20 +995,55 @@ def run(
 ) -> Tuple[List[str], Tuple[int, int]]:
     """Run turtle `t` on L-system string `string` with given options."""
     initial_angle, initial_length, initial_thickness = angle, length, thickness
-    swap_signs, swap_cases, modify_fill = False, False, False
+    swap_cases, modify_fill = False, False
+    turn_sign = 1.0  # Flipped by & rather than kept as a flag so turns just multiply by it.
+    half_circle = circle/2.0
+    turn_orient = -1.0 if t.screen.mode() == 'logo' else 1.0  # Logo mode's positive angles go clockwise.
     pen_color: Optional[Tuple[float, float, float]] = colors[0]
     fill_color: Optional[Tuple[float, float, float]] = colors[1]
     stack: List[State] = []
     eps_paths: List[str] = []
     size = (1, 1)
     draws, frames_attempted = 0, 0
+    changed = False  # Whether anything was drawn since the last gif frame was saved.
+    # Turtle methods used by the most frequent instructions, looked up once rather than on every call.
+    forward, pen_down, pen_up, pensize = t.forward, t.pendown, t.penup, t.pensize
+    pen_width = 0.0  # Mirrors the turtle's pensize so drawing moves don't have to ask for it.
+    applied_colors: List[OpColor] = [None, None]  # The pen and fill colors last given to the turtle.
+    get_heading, get_position, left, right = t.heading, t.position, t.left, t.right
+    begin_fill, end_fill, dot, color_setters = t.begin_fill, t.end_fill, t.dot, (t.pencolor, t.fillcolor)
+    # Consecutive moves in the same direction are merged into one forward call since each call is costly for turtle.
+    pending_moves, pending_length, pending_down = 0, 0.0, False
+
+    def flush() -> None:
+        nonlocal pending_moves, pending_length
+        if pending_moves:
+            if pending_down:
+                pen_down()
+            else:
+                pen_up()
+            forward(pending_length)
+            pending_moves, pending_length = 0, 0.0
+
+    def queue_move(down: bool) -> None:
+        nonlocal pending_moves, pending_length, pending_down
+        if pending_moves and (down != pending_down or (length < 0) != (pending_length < 0)):
+            flush()  # Moves that backtrack along the line can't be merged without losing what they drew.
+        pending_moves += 1
+        pending_length += length
+        pending_down = down
 
     def save_frame() -> None:
-        nonlocal frames_attempted, size
+        nonlocal frames_attempted, size, changed
+        flush()
         frames_attempted += 1
         if max_frames is None or len(eps_paths) < max_frames:
-            eps = str((cast(Path, drawdir) / f'{FRAME_NAME}{len(eps_paths)}').with_suffix(EPS_EXT))
-            size = save_eps(eps)
+            if changed or not eps_paths or t.isvisible():  # A visible turtle shape changes the canvas as it moves.
+                eps = str((cast(Path, drawdir) / f'{FRAME_NAME}{len(eps_paths)}').with_suffix(EPS_EXT))
+                size = save_eps(eps)
+                changed = False
+            else:
+                eps = eps_paths[-1]  # Nothing was drawn since the last frame so it is repeated rather than resaved.
             eps_paths.append(eps)
 
     def drew() -> None:
@@ -918,141 +1054,249 @@ def run(
                 save_frame()
 
     def set_pensize() -> None:
-        t.pensize(max(0, thickness))  # type: ignore
+        nonlocal pen_width
+        flush()
+        pen_width = max(0, thickness)
+        pensize(pen_width)  # type: ignore
+
+    def apply_color(color: Tuple[float, float, float], fill: bool) -> None:
+        conformed = conform_color(color)
+        if conformed != applied_colors[fill]:  # Repeats, like gradients stuck at a bound, aren't sent to the turtle.
+            flush()
+            applied_colors[fill] = conformed
+            color_setters[fill](cast(Color, conformed))
 
     def set_color(color: Optional[Tuple[float, float, float]]) -> None:
         nonlocal pen_color, fill_color, modify_fill
-        if modify_fill:
+        fill = modify_fill
+        if fill:
             modify_fill = False
             fill_color = color
-            if fill_color:
-                t.fillcolor(cast(Color, conform_color(fill_color)))
         else:
             pen_color = color
-            if pen_color:
-                t.pencolor(cast(Color, conform_color(pen_color)))
+        if color:
+            apply_color(color, fill)
 
-    def increment_color(channel: int, decrement: bool = False) -> None:
+    def increment_color(channel: int, amount: float) -> None:
         color = fill_color if modify_fill else pen_color
         if color:
-            amount = (-1 if decrement else 1) * color_increments[channel]
             lst = list(color)
-            lst[channel] = clamp(lst[channel] + amount)
+            lst[channel] = max(0, min(lst[channel] + amount, 255))  # Inlined clamp, this runs for every ,.;:?! char.
             set_color((lst[0], lst[1], lst[2]))
 
-    set_pensize()
-    if pen_color:
-        t.pencolor(cast(Color, conform_color(pen_color)))
-    if fill_color:
-        t.fillcolor(cast(Color, conform_color(fill_color)))
-    if gif:
-        save_frame()
-
-    for i, c in enumerate(string):
-        if max_chars is not None and i >= max_chars or max_draws is not None and draws >= max_draws:
-            break
-        if swap_cases and c.isalpha():
-            c = c.lower() if c.isupper() else c.upper()
+    # Instruction handlers, dispatched by character so each one costs a single dict lookup rather than an elif chain.
+    def move_drawing() -> None:
+        nonlocal changed
+        visible = bool(pen_color and pen_width)
+        changed = changed or visible
+        queue_move(visible)
+        drew()
+
+    def move() -> None:
+        queue_move(False)
+
+    def reset_length() -> None:
+        nonlocal length
+        length = initial_length
+
+    def increment_length() -> None:
+        nonlocal length
+        length += length_increment
+
+    def decrement_length() -> None:
+        nonlocal length
+        length -= length_increment
+
+    def multiply_length() -> None:
+        nonlocal length
+        length *= length_scalar
+
+    def divide_length() -> None:
+        nonlocal length
+        length /= length_scalar
+
+    def turn(amount: float) -> None:
+        # Rotating directly skips the two trigonometric heading lookups a set_heading relative to the heading costs.
+        # The amount is wrapped like set_heading does so the turtle still turns the short way round when animated.
+        flush()
+        left((turn_orient * amount + half_circle) % circle - half_circle)
+
+    def turn_positively() -> None:
+        turn(turn_sign * angle)
+
+    def turn_negatively() -> None:
+        turn(-turn_sign * angle)
+
+    def swap_turns() -> None:
+        nonlocal turn_sign
+        turn_sign = -turn_sign
+
+    def half_turn() -> None:
+        flush()
+        right(half_circle)
+
+    def reset_angle() -> None:
+        nonlocal angle
+        angle = initial_angle
+
+    def increment_angle() -> None:
+        nonlocal angle
+        angle += angle_increment
+
+    def decrement_angle() -> None:
+        nonlocal angle
+        angle -= angle_increment
+
+    def reset_thickness() -> None:
+        nonlocal thickness
+        thickness = initial_thickness
+        set_pensize()
+
+    def increment_thickness() -> None:
+        nonlocal thickness
+        thickness = max(0, thickness + thickness_increment)
+        set_pensize()
+
+    def decrement_thickness() -> None:
+        nonlocal thickness
+        thickness = max(0, thickness - thickness_increment)
+        set_pensize()
+
+    def select_fill() -> None:
+        nonlocal modify_fill
+        modify_fill = True
+
+    def begin_polygon() -> None:
+        flush()
+        if fill_color:
+            begin_fill()
+
+    def end_polygon() -> None:
+        nonlocal changed
+        flush()
+        if fill_color:
+            changed = True
+            end_fill()
+        drew()
+
+    def draw_dot() -> None:
+        nonlocal changed
+        flush()
+        if fill_color:
+            changed = True
+            dot(None, fill_color)
+        drew()
+
+    def swap_letters() -> None:
+        nonlocal swap_cases
+        swap_cases = not swap_cases
+
+    def reset_position() -> None:
+        flush()
+        orient(t, position)
+
+    def reset_heading() -> None:
+        flush()
+        orient(t, None, heading)
+
+    def push_state() -> None:
+        flush()
+        stack.append(State(get_position(), get_heading(), angle, length, thickness,
+                           pen_color, fill_color, turn_sign, swap_cases, modify_fill))
+
+    def pop_state() -> None:
+        nonlocal angle, length, turn_sign, swap_cases, modify_fill, pen_color, fill_color
+        if stack:
+            flush()
+            state = stack.pop()
+            if state.position != get_position() or state.heading != get_heading():  # Brackets may not have moved.
+                orient(t, state.position, state.heading)
+            angle, length = state.angle, state.length
+            turn_sign, swap_cases, modify_fill = state.turn_sign, state.swap_cases, state.modify_fill
+            pen_color, fill_color = state.pen_color, state.fill_color
 
+    handlers: Dict[str, Callable[[], None]] = {
         # Length:
-        if 'A' <= c <= 'Z':
-            if pen_color and t.pensize():
-                t.pendown()
-            else:
-                t.penup()
-            t.forward(length)
-            drew()
-        elif 'a' <= c <= 'z':
-            t.penup()
-            t.forward(length)
-        elif c == '_':
-            length = initial_length
-        elif c == '^':
-            length += length_increment
-        elif c == '%':
-            length -= length_increment
-        elif c == '*':
-            length *= length_scalar
-        elif c == '/':
-            length /= length_scalar
+        **dict.fromkeys(ascii_uppercase, move_drawing),
+        **dict.fromkeys(ascii_lowercase, move),
+        '_': reset_length,
+        '^': increment_length,
+        '%': decrement_length,
+        '*': multiply_length,
+        '/': divide_length,
         # Angle:
-        elif c == '+':
-            t.seth(t.heading() + (-1 if swap_signs else 1) * angle)
-        elif c == '-':
-            t.seth(t.heading() - (-1 if swap_signs else 1) * angle)
-        elif c == '&':
-            swap_signs = not swap_signs
-        elif c == '|':
-            t.right(circle/2.0)
-        elif c == '~':
-            angle = initial_angle
-        elif c == ')':
-            angle += angle_increment
-        elif c == '(':
-            angle -= angle_increment
+        '+': turn_positively,
+        '-': turn_negatively,
+        '&': swap_turns,
+        '|': half_turn,
+        '~': reset_angle,
+        ')': increment_angle,
+        '(': decrement_angle,
         # Thickness:
-        elif c == '=':
-            thickness = initial_thickness
-            set_pensize()
-        elif c == '>':
-            thickness = max(0, thickness + thickness_increment)
-            set_pensize()
-        elif c == '<':
-            thickness = max(0, thickness - thickness_increment)
-            set_pensize()
+        '=': reset_thickness,
+        '>': increment_thickness,
+        '<': decrement_thickness,
         # Color:
-        elif '0' <= c <= '9':
-            set_color(colors[int(c)])
-        elif c == '#':
-            modify_fill = True
-        elif c == ',':
-            increment_color(0)
-        elif c == '.':
-            increment_color(0, True)
-        elif c == ';':
-            increment_color(1)
-        elif c == ':':
-            increment_color(1, True)
-        elif c == '?':
-            increment_color(2)
-        elif c == '!':
-            increment_color(2, True)
+        **{digit: partial(set_color, colors[int(digit)]) for digit in digits},
+        '#': select_fill,
+        ',': partial(increment_color, 0, color_increments[0]),
+        '.': partial(increment_color, 0, -color_increments[0]),
+        ';': partial(increment_color, 1, color_increments[1]),
+        ':': partial(increment_color, 1, -color_increments[1]),
+        '?': partial(increment_color, 2, color_increments[2]),
+        '!': partial(increment_color, 2, -color_increments[2]),
         # Other:
-        elif c == '{':
-            if fill_color:
-                t.begin_fill()
-        elif c == '}':
-            if fill_color:
-                t.end_fill()
-            drew()
-        elif c == '@':
-            if fill_color:
-                t.dot(None, fill_color)
-            drew()
-        elif c == '`':
-            swap_cases = not swap_cases
-        elif c == '"':
-            orient(t, position)
-        elif c == "'":
-            orient(t, None, heading)
-        elif c == '$':
-            stack.clear()
-        elif c == '[':
-            stack.append(State((t.xcor(), t.ycor()), t.heading(), angle, length, thickness,
-                               pen_color, fill_color, swap_signs, swap_cases, modify_fill))
-        elif c == ']':
-            if stack:
-                state = stack.pop()
-                orient(t, state.position, state.heading)
-                angle, length = state.angle, state.length
-                swap_signs, swap_cases, modify_fill = state.swap_signs, state.swap_cases, state.modify_fill
-                pen_color, fill_color = state.pen_color, state.fill_color
+        '{': begin_polygon,
+        '}': end_polygon,
+        '@': draw_dot,
+        '`': swap_letters,
+        '"': reset_position,
+        "'": reset_heading,
+        '$': stack.clear,
+        '[': push_state,
+        ']': pop_state,
+    }
+
+    set_pensize()
+    if pen_color:
+        apply_color(pen_color, False)
+    if fill_color:
+        apply_color(fill_color, True)
+    if gif:
+        save_frame()
 
-        if not isinstance(frame_every, int) and c in frame_every:
+    # Limits and options that don't change during the loop are settled beforehand to keep per-character work minimal.
+    if max_chars is not None:
+        string = string[:max(0, max_chars)]
+    draw_limit = float('inf') if max_draws is None else max_draws
+    frame_chars = None if isinstance(frame_every, int) else frame_every
+    get_handler = handlers.get
+    for c in string:
+        if draws >= draw_limit:
+            break
+        if swap_cases:
+            swapped = SWAPPED_CASES.get(c)
+            if swapped:
+                c = swapped
+            elif c.isalpha():  # Other letters have no instruction but callbacks and frame_every still see them swapped.
+                c = c.lower() if c.isupper() else c.upper()
+        handler = get_handler(c)
+        if handler:
+            handler()
+
+        if frame_chars is not None and c in frame_chars:
             save_frame()
 
-        if callback and callback(c, t) or c == '\\':
+        if callback:
+            flush()
+            if callback(c, t):
+                break
+            pen_width = pensize()  # The callback may have changed these.
+            applied_colors[:] = None, None
+            changed = True
+        if c == '\\':
             break
+    flush()
 
     if gif:
         if isinstance(frame_every, int) and draws % frame_every != 0:
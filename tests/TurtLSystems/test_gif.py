@@ -0,0 +1,43 @@
+"""File to test converting gif frames."""
+
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+import pytest
+from PIL import Image
+from TurtLSystems import source
+
+
+@pytest.mark.parametrize('cpus', [1, 4, None])
+def test_frame_batches(cpus: Optional[int], tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Testing that frames are converted in bounded batches and every png ends up under its frame name."""
+    batches: List[int] = []
+
+    def fake_eps_to_png(eps: Union[str, List[str]], png: str, size: Tuple[int, int], *_: float) -> None:
+        assert isinstance(eps, list)
+        batches.append(len(eps))
+        for page, path in enumerate(eps, 1):  # Stands in for ghostscript, marking each page with its frame number.
+            image = Image.new('RGBA', size, (0, 0, 0, 0))
+            image.putpixel((int(Path(path).read_text(encoding='utf-8')), 0), (255, 255, 255, 255))
+            head, _sep, tail = png.rpartition('%d')
+            image.save(head.replace('%%', '%') + str(page) + tail)
+
+    monkeypatch.setattr(source, 'eps_to_png', fake_eps_to_png)
+    monkeypatch.setattr(source, 'message', lambda *args, **kwargs: None)
+    monkeypatch.setattr(source.os, 'cpu_count', lambda: cpus)
+    folder = tmp_path / 'draw%d'
+    folder.mkdir()
+    eps_paths = []
+    for i in range(450):
+        eps = folder / f'{source.FRAME_NAME}{i}{source.EPS_EXT}'
+        eps.write_text(str(i), encoding='utf-8')
+        eps_paths.append(str(eps))
+    eps_paths += eps_paths[:3]  # Repeated frames share a png.
+
+    pngs = source.prep_gif(eps_paths, (450, 1), (0, 0, 0), 1, 4, None, True)
+    assert sum(batches) == 450
+    assert max(batches) <= source.MAX_EPS_PER_GHOSTSCRIPT
+    assert len(batches) >= (cpus or 1)
+    assert pngs[450:] == pngs[:3]
+    for i, png in enumerate(pngs[:450]):
+        assert Image.open(png).getbbox() == (i, 0, i + 1, 1)
@@ -2,7 +2,12 @@
 
 import string
 import random
-from TurtLSystems import draw
+import turtle
+from pathlib import Path
+from typing import Any, List, Tuple
+
+import pytest
+from TurtLSystems import draw, source
 
 
 def test_letters() -> None:
@@ -38,6 +43,79 @@ def test_plusminus() -> None:
     assert draw('f+-f', '', angle=45, length=10)[1].pos() == (20, 0)
 
 
+def test_plusminus_logo_mode() -> None:
+    """Testing + - in logo mode, where positive angles go clockwise."""
+    turtle.mode('logo')
+    try:
+        assert draw('ff+f', '', angle=90, length=10, skip_init=True)[1].pos() == (10, 20)
+        assert draw('ff-f', '', angle=90, length=10, skip_init=True)[1].pos() == (-10, 20)
+        assert draw('f+-f', '', angle=45, length=10, skip_init=True)[1].pos() == (0, 20)
+    finally:
+        turtle.mode('standard')
+
+
+def drawn_lines(t: turtle.Turtle) -> List[Tuple[str, float, float, float]]:
+    """Returns the color, width, min x and max x of every line `t` drew on the canvas."""
+    canvas: Any = t.getscreen().getcanvas()
+    lines = []
+    for item in t.items:  # type: ignore
+        xs = canvas.coords(item)[::2]
+        if canvas.type(item) == 'line' and len(xs) > 1 and canvas.itemcget(item, 'fill'):
+            lines.append((canvas.itemcget(item, 'fill'), float(canvas.itemcget(item, 'width')), min(xs), max(xs)))
+    return lines
+
+
+def extent(t: turtle.Turtle) -> Tuple[float, float]:
+    """Returns the min x and max x of everything `t` drew."""
+    lines = drawn_lines(t)
+    return min(line[2] for line in lines), max(line[3] for line in lines)
+
+
+def test_merged_moves_backtracking() -> None:
+    """Testing that moves are not merged across a change of direction."""
+    t = draw('F^F', '', length=10, length_increment=-20)[1]
+    assert t.xcor() == 0 and extent(t) == (0, 10)
+    t = draw('F^F^F', '', length=10, length_increment=-15)[1]
+    assert t.xcor() == -15 and extent(t) == (-15, 10)
+    t = draw('F|F', '', length=10)[1]
+    assert t.xcor() == 0 and extent(t) == (0, 10)
+
+
+def test_merged_moves_interrupted() -> None:
+    """Testing that a color or thickness change ends a merged move."""
+    t = draw('FF2FF', '', length=10)[1]
+    assert drawn_lines(t) == [('#ffffff', 1.0, 0, 20), ('#ff0000', 1.0, 20, 40)]
+    t = draw('FF>FF', '', length=10)[1]
+    assert drawn_lines(t) == [('#ffffff', 1.0, 0, 20), ('#ffffff', 2.0, 20, 40)]
+
+
+def test_merged_moves_max_draws() -> None:
+    """Testing that max_draws cuts a merged move short."""
+    t = draw('FFFF', '', length=10, max_draws=2)[1]
+    assert t.xcor() == 20 and extent(t) == (0, 20)
+    t = draw('FF2FF', '', length=10, max_draws=3)[1]
+    assert drawn_lines(t) == [('#ffffff', 1.0, 0, 20), ('#ff0000', 1.0, 20, 30)]
+
+
+def test_gif_repeated_frames(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Testing that frames after pen up moves reuse the previous eps and that no frames go missing."""
+    frames: List[List[str]] = []
+
+    def fake_prep_gif(eps_paths: List[str], *_: Any) -> List[str]:
+        frames.append(eps_paths)
+        return []
+    monkeypatch.setattr(source, 'prep_gif', fake_prep_gif)
+    monkeypatch.setattr(source, 'save_gif', lambda *args: None)
+    gif = str(tmp_path / 'test.gif')
+    draw('Ffff', '', gif=gif, frame_every='f')
+    draw('FfFf', '', gif=gif, frame_every='f')
+    draw('Ffff', '', gif=gif, frame_every='f', show_turtle=True)
+    assert [len(eps_paths) for eps_paths in frames] == [4, 3, 4]
+    assert frames[0][1] == frames[0][2] == frames[0][3] != frames[0][0]
+    assert len(set(frames[1])) == 3
+    assert len(set(frames[2])) == 4  # A visible turtle changes the canvas as it moves.
+
+
 # TODO test the rest
 
 
@@ -0,0 +1,98 @@
+"""File to test L-system expansion and its cache."""
+# pylint: disable=protected-access
+
+import random
+from typing import Dict
+
+import pytest
+from TurtLSystems import lsystem, source
+
+
+def reference(start: str, rules: Dict[str, str], level: int) -> str:
+    """Plain uncached expansion to compare against."""
+    for _ in range(level):
+        start = ''.join(rules.get(c, c) for c in start)
+    return start
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Gives every test its own empty expansion cache."""
+    monkeypatch.setattr(source, '_EXPANSIONS', {})
+
+
+def test_levels() -> None:
+    """Testing every level against the reference, shallow and deep calls interleaved."""
+    rules = {'F': 'F+G-F', 'G': 'GG', '+': '+'}
+    for level in [3, 0, 1, 5, 2, 4, 5]:
+        assert lsystem('F+G', rules, level) == reference('F+G', rules, level)
+
+
+def test_rules_string() -> None:
+    """Testing space separated rules and one-to-one rules."""
+    assert lsystem('AB', 'A AB B A', 4) == reference('AB', {'A': 'AB', 'B': 'A'}, 4)
+    assert lsystem('AB', 'A B B A', 3) == 'BA'
+    assert lsystem('AB', '', 3) == 'AB'
+
+
+def test_multi_char_keys() -> None:
+    """Testing that keys longer than one character never match."""
+    assert lsystem('FG', {'FG': 'x', 'F': 'FG'}, 2) == 'FGGG'
+    assert lsystem('FG', {'FG': 'x', 'G': 'F'}, 2) == 'FF'
+
+
+def test_random_patterns() -> None:
+    """Testing repeated calls with many different starts and rules."""
+    rnd = random.Random(0)
+    cases = []
+    for _ in range(50):
+        rules = {k: ''.join(rnd.choice('FG+-[]') for _ in range(rnd.randint(0, 4))) for k in rnd.sample('FG+-', 2)}
+        start = ''.join(rnd.choice('FG+-') for _ in range(rnd.randint(0, 4)))
+        cases.append((start, rules, rnd.randint(0, 5)))
+    for start, rules, level in cases + cases[::-1]:
+        assert lsystem(start, rules, level) == reference(start, rules, level)
+
+
+def test_resume_from_deepest() -> None:
+    """Testing that deeper levels continue from the deepest cached level."""
+    rules = {'F': 'FG', 'G': 'F'}
+    lsystem('F', rules, 3)
+    levels = source._EXPANSIONS['F', frozenset(rules.items())]
+    levels[3] = 'G'  # Planted so reuse of level 3 is visible.
+    assert lsystem('F', rules, 4) == 'F'
+    assert lsystem('F', rules, 3) == 'G'
+    assert lsystem('F', rules, 2) == reference('F', rules, 2)
+
+
+def test_eviction_order(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Testing that the least recently used pattern is evicted first."""
+    monkeypatch.setattr(source, 'MAX_CACHED_CHARS', 15)
+    lsystem('A', 'A AA', 2)
+    lsystem('B', 'B BB', 2)
+    lsystem('A', 'A AA', 1)  # A is now the most recently used.
+    lsystem('C', 'C CC', 2)
+    cached = [start for start, _ in source._EXPANSIONS]
+    assert cached == ['A', 'C']
+
+
+def test_trimming(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Testing that the cache never holds more than MAX_CACHED_CHARS, even for one large pattern."""
+    monkeypatch.setattr(source, 'MAX_CACHED_CHARS', 100)
+
+    def cached() -> int:
+        return sum(len(s) for levels in source._EXPANSIONS.values() for s in levels.values())
+
+    sizes = []
+    trim_expansions = source.trim_expansions
+
+    def recording_trim_expansions() -> None:
+        trim_expansions()
+        sizes.append(cached())
+    monkeypatch.setattr(source, 'trim_expansions', recording_trim_expansions)
+
+    assert lsystem('F', 'F FF', 10) == 'F' * 1024
+    assert len(sizes) == 10 and max(sizes) <= 100  # Trimmed as each level is expanded, not only at the end.
+    assert sorted(next(iter(source._EXPANSIONS.values()))) == [0, 1, 2, 3, 4, 5]  # Deepest levels go first.
+    assert lsystem('F', 'F FF', 10) == 'F' * 1024
+    assert lsystem('F' * 101, 'F FF', 1) == 'F' * 202
+    assert cached() == 0
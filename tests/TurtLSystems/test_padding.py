@@ -0,0 +1,69 @@
+"""File to test finding the padding rectangle of png output."""
+
+import random
+from typing import Any, Tuple
+
+import pytest
+from PIL import Image
+from TurtLSystems.source import get_padding_rect
+
+BACKGROUND = (0, 0, 0)
+
+
+def loop_padding_rect(image: Image.Image, padding: int, background_color: Tuple[int, int, int]) -> Tuple[int, ...]:
+    """Plain per-pixel version to compare against."""
+    data: Any = image.load()
+    content = [(x, y) for y in range(image.height) for x in range(image.width)
+               if data[x, y][3] and data[x, y][:3] != background_color]
+    if content:
+        x_min, y_min = min(x for x, _ in content), min(y for _, y in content)
+        x_max, y_max = max(x for x, _ in content), max(y for _, y in content)
+    else:
+        x_min = x_max = image.width//2
+        y_min = y_max = image.height//2
+    return x_min - padding, y_min - padding, max(x_max + padding, x_min - padding) + 1, \
+        max(y_max + padding, y_min - padding) + 1
+
+
+@pytest.fixture(params=[False, True], ids=['getbbox', 'old_pillow'])
+def old_pillow(request: Any, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Runs a test as is and again with getbbox lacking alpha_only, like Pillow before 10.1."""
+    if request.param:
+        getbbox = Image.Image.getbbox
+
+        def old_getbbox(self: Image.Image) -> Any:
+            return getbbox(self)
+        monkeypatch.setattr(Image.Image, 'getbbox', old_getbbox)
+
+
+@pytest.mark.usefixtures('old_pillow')
+def test_empty() -> None:
+    """Testing that images without content are padded around their center."""
+    image = Image.new('RGBA', (10, 7), (255, 255, 255, 0))
+    assert get_padding_rect(image, 0, BACKGROUND) == (5, 3, 6, 4)
+    assert get_padding_rect(image, 2, BACKGROUND) == (3, 1, 8, 6)
+
+
+@pytest.mark.usefixtures('old_pillow')
+def test_background_colored_pixels() -> None:
+    """Testing that opaque background colored pixels are not content."""
+    image = Image.new('RGBA', (10, 10), (0, 0, 0, 0))
+    image.putpixel((1, 1), BACKGROUND + (255,))
+    image.putpixel((8, 8), BACKGROUND + (128,))
+    assert get_padding_rect(image, 0, BACKGROUND) == (5, 5, 6, 6)
+    image.putpixel((3, 2), (0, 0, 1, 255))
+    image.putpixel((6, 4), (255, 0, 0, 1))
+    assert get_padding_rect(image, 1, BACKGROUND) == (2, 1, 8, 6)
+
+
+@pytest.mark.usefixtures('old_pillow')
+def test_random_images() -> None:
+    """Testing random images against the per-pixel version."""
+    rnd = random.Random(0)
+    pixels = [BACKGROUND + (255,), BACKGROUND + (0,), (0, 255, 0, 0), (0, 255, 0, 255), (9, 9, 9, 40)]
+    for _ in range(100):
+        image = Image.new('RGBA', (rnd.randint(1, 12), rnd.randint(1, 12)), (0, 0, 0, 0))
+        for _ in range(rnd.randint(0, 6)):
+            image.putpixel((rnd.randrange(image.width), rnd.randrange(image.height)), rnd.choice(pixels))
+        padding = rnd.randint(0, 3)
+        assert get_padding_rect(image, padding, BACKGROUND) == loop_padding_rect(image, padding, BACKGROUND)